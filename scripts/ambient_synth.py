@@ -0,0 +1,402 @@
+"""
+アンビエントBGM シンセサイザー (NumPy)
+
+機能:
+    - プロンプトのキーワードから音色レイヤーを選択（雨・波・焚き火・ピアノなど）
+    - フィルターノイズ・パッド・コード進行を重ねて合成
+    - ブロック単位で生成して audio_io 経由でディスクに書き出す
+    - ACE-Step が使えない場合のフォールバック用
+"""
+
+import numpy as np
+
+from audio_io import DEFAULT_BLOCK_FRAMES, write_blocks
+
+SAMPLE_RATE = 44100
+
+# 1コードの長さ（秒）
+CHORD_SECONDS = 8.0
+
+# フェードイン・フェードアウト（秒）
+FADE_SECONDS = 3.0
+
+# コード進行（MIDIノート番号、先頭がルート）
+PROGRESSIONS = {
+    # I - vi - IV - V (add9)
+    'ambient': [
+        [48, 55, 62, 64, 67],
+        [45, 52, 60, 64, 71],
+        [41, 48, 57, 60, 67],
+        [43, 50, 59, 62, 69],
+    ],
+    # ii7 - V7 - Imaj7 - vi7
+    'jazz': [
+        [50, 57, 60, 65, 69],
+        [43, 53, 59, 62, 65],
+        [48, 55, 59, 64, 67],
+        [45, 55, 60, 64, 67],
+    ],
+    # i - VI - III - VII
+    'minor': [
+        [45, 52, 60, 64, 67],
+        [41, 53, 57, 60, 65],
+        [48, 55, 60, 64, 67],
+        [43, 55, 59, 62, 67],
+    ],
+    # ドローン（コードチェンジなし）
+    'drone': [
+        [38, 45, 57, 62, 64],
+    ],
+}
+
+# キーワード → コード進行
+PROGRESSION_KEYWORDS = {
+    'jazz': 'jazz',
+    'bossa': 'jazz',
+    'cafe': 'jazz',
+    'cyberpunk': 'minor',
+    'synthwave': 'minor',
+    'night': 'minor',
+    'zen': 'drone',
+    'meditation': 'drone',
+}
+
+# キーワード → 追加レイヤー
+LAYER_KEYWORDS = {
+    'rain': 'rain',
+    'rainy': 'rain',
+    'ocean': 'ocean',
+    'waves': 'ocean',
+    'beach': 'ocean',
+    'stream': 'stream',
+    'fireplace': 'fire',
+    'crackling': 'fire',
+    'breeze': 'wind',
+    'wind': 'wind',
+    'piano': 'piano',
+    'guitar': 'piano',
+    'acoustic': 'piano',
+    'lofi': 'vinyl',
+}
+
+# レイヤーごとの音量
+LAYER_GAINS = {
+    'pad': 0.22,
+    'rain': 0.10,
+    'ocean': 0.35,
+    'stream': 0.10,
+    'fire': 0.30,
+    'wind': 0.35,
+    'piano': 0.18,
+    'vinyl': 0.08,
+}
+
+
+def select_layers(prompt):
+    """
+    プロンプトからコード進行とレイヤーを選択
+
+    Returns:
+        (コード進行名, レイヤー名のリスト)
+    """
+    words = prompt.lower().split()
+
+    progression = 'ambient'
+    for keyword, name in PROGRESSION_KEYWORDS.items():
+        if keyword in words:
+            progression = name
+            break
+
+    layers = ['pad']
+    for word in words:
+        layer = LAYER_KEYWORDS.get(word)
+        if layer and layer not in layers:
+            layers.append(layer)
+
+    return progression, layers
+
+
+def _smooth(x, history, k):
+    """
+    長さkの移動平均（ブロック間で状態を引き継ぐローパス）
+
+    Returns:
+        (フィルター後のブロック, 次のブロック用の履歴)
+    """
+    buf = np.concatenate([history, x])
+    c = np.cumsum(buf, axis=0)
+    y = (c[k:] - c[:-k]) / k
+    return y, buf[-k:]
+
+
+def _lowpass(rng, block_frames, k, passes=2):
+    """ローパスしたステレオノイズを生成し続ける"""
+    histories = [np.zeros((k, 2)) for _ in range(passes)]
+    while True:
+        x = rng.standard_normal((block_frames, 2))
+        for i in range(passes):
+            x, histories[i] = _smooth(x, histories[i], k)
+        # 移動平均で下がった振幅を補正
+        yield x * np.sqrt(k)
+
+
+def _times(start, n, sample_rate):
+    """ブロック内の各サンプルの絶対時刻（秒）"""
+    return (start + np.arange(n)) / sample_rate
+
+
+def _layer_rain(rng, sample_rate, block_frames):
+    """雨: 高域ノイズ + ゆっくりした強弱"""
+    body = _lowpass(rng, block_frames, 3, passes=1)
+    hiss_hist = np.zeros((12, 2))
+    start = 0
+    while True:
+        x = rng.standard_normal((block_frames, 2))
+        low, hiss_hist = _smooth(x, hiss_hist, 12)
+        hiss = x - low
+        t = _times(start, block_frames, sample_rate)[:, None]
+        intensity = 0.8 + 0.2 * np.sin(2 * np.pi * 0.03 * t)
+        yield (hiss + 0.5 * next(body)) * intensity
+        start += block_frames
+
+
+def _layer_ocean(rng, sample_rate, block_frames):
+    """波: 低域ノイズを約11秒周期でうねらせる（左右で位相をずらす）"""
+    noise = _lowpass(rng, block_frames, 40)
+    start = 0
+    while True:
+        t = _times(start, block_frames, sample_rate)[:, None]
+        phase = 2 * np.pi * 0.09 * t + np.array([0.0, 0.6])
+        swell = np.sin(phase) ** 2
+        yield next(noise) * (0.15 + swell)
+        start += block_frames
+
+
+def _layer_stream(rng, sample_rate, block_frames):
+    """小川: 中域のバンドパスノイズ + 細かい揺らぎ"""
+    bright = _lowpass(rng, block_frames, 5, passes=1)
+    dull = _lowpass(rng, block_frames, 30, passes=1)
+    start = 0
+    while True:
+        t = _times(start, block_frames, sample_rate)[:, None]
+        flutter = 0.7 + 0.3 * np.sin(2 * np.pi * 3.1 * t + np.sin(2 * np.pi * 0.7 * t))
+        yield (next(bright) - 0.6 * next(dull)) * flutter
+        start += block_frames
+
+
+def _layer_wind(rng, sample_rate, block_frames):
+    """風: ごく低域のノイズをゆっくり強弱"""
+    noise = _lowpass(rng, block_frames, 200)
+    start = 0
+    while True:
+        t = _times(start, block_frames, sample_rate)[:, None]
+        gust = 0.5 + 0.5 * np.sin(2 * np.pi * 0.04 * t + np.array([0.0, 1.3])) ** 2
+        yield next(noise) * gust
+        start += block_frames
+
+
+def _crackles(rng, sample_rate, block_frames, rate, decay):
+    """
+    パチパチ音: ランダムな位置に減衰するノイズ粒を置く
+
+    ブロック境界をまたぐ粒の残りは次のブロックに持ち越す。
+    """
+    length = int(decay * 6 * sample_rate)
+    envelope = np.exp(-np.arange(length) / (decay * sample_rate))[:, None]
+    carry = np.zeros((length, 2))
+    while True:
+        out = np.zeros((block_frames + length, 2))
+        out[:length] += carry
+        count = rng.poisson(rate * block_frames / sample_rate)
+        positions = rng.integers(0, block_frames, count)
+        amps = rng.uniform(0.2, 1.0, (count, 2)) ** 2
+        for pos, amp in zip(positions, amps):
+            grain = rng.standard_normal((length, 2)) * envelope * amp
+            out[pos:pos + length] += grain
+        carry = out[block_frames:].copy()
+        yield out[:block_frames]
+
+
+def _layer_fire(rng, sample_rate, block_frames):
+    """焚き火: 低いゴーッという音 + パチパチ"""
+    rumble = _lowpass(rng, block_frames, 150)
+    crackle = _crackles(rng, sample_rate, block_frames, rate=6.0, decay=0.004)
+    while True:
+        yield 0.4 * next(rumble) + next(crackle)
+
+
+def _layer_vinyl(rng, sample_rate, block_frames):
+    """レコードノイズ: 細かいプチプチ音"""
+    crackle = _crackles(rng, sample_rate, block_frames, rate=12.0, decay=0.0008)
+    while True:
+        yield next(crackle)
+
+
+def _midi_to_hz(note):
+    return 440.0 * 2.0 ** ((note - 69) / 12.0)
+
+
+# 正弦波テーブル（2^16 点）
+_SINE_BITS = 16
+_SINE_TABLE = np.sin(2 * np.pi * np.arange(2 ** _SINE_BITS) / 2 ** _SINE_BITS).astype(np.float32)
+
+
+def _osc(freq, start, n, sample_rate):
+    """
+    正弦波オシレーター（テーブル参照）
+
+    位相は絶対サンプル位置 x 32bit固定小数点の増分で求めるため、
+    ブロック間で連続し、np.sin を毎サンプル計算するより大幅に速い。
+    """
+    step = np.uint64(round(freq / sample_rate * 2 ** 32))
+    phase = np.arange(start, start + n, dtype=np.uint64) * step
+    index = (phase >> np.uint64(32 - _SINE_BITS)) & np.uint64(2 ** _SINE_BITS - 1)
+    return _SINE_TABLE[index]
+
+
+def _layer_pad(progression, sample_rate, block_frames):
+    """
+    パッド: コードをハン窓で重ねながら切り替える
+
+    コードkは [(k-1)L, (k+1)L] の区間で sin^2 窓をかけるので、
+    隣り合うコードの窓の和は常に1になる。
+    """
+    chords = PROGRESSIONS[progression]
+    hop = CHORD_SECONDS * sample_rate
+    detune = np.array([0.9985, 1.0015])
+    start = 0
+    while True:
+        end = start + block_frames
+        out = np.zeros((block_frames, 2), dtype=np.float32)
+        first = int(start // hop)
+        last = int(end // hop) + 1
+        for k in range(first, last + 1):
+            lo = max(int((k - 1) * hop), start)
+            hi = min(int((k + 1) * hop), end)
+            if lo >= hi:
+                continue
+            n = hi - lo
+            pos = (np.arange(lo, hi) - (k - 1) * hop) / (2 * hop)
+            window = (np.sin(np.pi * pos) ** 2).astype(np.float32)
+
+            chord = chords[k % len(chords)]
+            voices = np.zeros((n, 2), dtype=np.float32)
+            for i, note in enumerate(chord):
+                freq = _midi_to_hz(note)
+                # ルートは低めに、上の音ほど小さく
+                amp = 1.0 / (1 + 0.35 * i)
+                for ch in range(2):
+                    voices[:, ch] += amp * _osc(freq * detune[ch], lo, n, sample_rate)
+            out[lo - start:hi - start] += voices * window[:, None]
+
+        yield out / len(chords[0])
+        start = end
+
+
+def _layer_piano(progression, rng_seed, sample_rate, block_frames):
+    """ピアノ風: コードの構成音を減衰付きでアルペジオ"""
+    chords = PROGRESSIONS[progression]
+    step = CHORD_SECONDS / 4 * sample_rate
+    tail = int(4.0 * sample_rate)
+    decay = 1.2 * sample_rate
+    start = 0
+    while True:
+        end = start + block_frames
+        out = np.zeros((block_frames, 2), dtype=np.float32)
+        first = max(int((start - tail) // step), 0)
+        last = int(end // step)
+        for s in range(first, last + 1):
+            onset = int(s * step)
+            lo = max(onset, start)
+            hi = min(onset + tail, end)
+            if lo >= hi:
+                continue
+
+            # 打鍵ごとに決まった乱数で音とパンを選ぶ（ブロック分割に依存しない）
+            strike = np.random.default_rng((rng_seed, s))
+            chord = chords[int(s * step // (CHORD_SECONDS * sample_rate)) % len(chords)]
+            note = chord[strike.integers(1, len(chord))] + 12
+            pan = strike.uniform(0.3, 0.7)
+            freq = _midi_to_hz(note)
+
+            age = np.arange(lo - onset, hi - onset)
+            env = np.exp(-age / decay).astype(np.float32)
+            tone = _osc(freq, lo - onset, hi - lo, sample_rate) \
+                + 0.3 * _osc(freq * 2, lo - onset, hi - lo, sample_rate)
+            voice = tone * env
+            out[lo - start:hi - start, 0] += voice * (1 - pan)
+            out[lo - start:hi - start, 1] += voice * pan
+
+        yield out
+        start = end
+
+
+def render_blocks(prompt, duration, sample_rate=SAMPLE_RATE,
+                  block_frames=DEFAULT_BLOCK_FRAMES, seed=None):
+    """
+    プロンプトに合わせたアンビエント音声をブロック単位で生成
+
+    Args:
+        prompt: 音楽プロンプト
+        duration: 長さ（秒）
+        sample_rate: サンプリングレート
+        block_frames: 1ブロックのフレーム数
+        seed: 乱数シード
+
+    Yields:
+        (フレーム数, 2) の float32 ブロック（[-1, 1]）
+    """
+    if seed is None:
+        seed = int(np.random.SeedSequence().entropy % (2 ** 32))
+    rng = np.random.default_rng(seed)
+    progression, names = select_layers(prompt)
+
+    noise_layers = {
+        'rain': _layer_rain,
+        'ocean': _layer_ocean,
+        'stream': _layer_stream,
+        'wind': _layer_wind,
+        'fire': _layer_fire,
+        'vinyl': _layer_vinyl,
+    }
+    layers = []
+    for name in names:
+        if name == 'pad':
+            gen = _layer_pad(progression, sample_rate, block_frames)
+        elif name == 'piano':
+            gen = _layer_piano(progression, seed, sample_rate, block_frames)
+        else:
+            gen = noise_layers[name](rng, sample_rate, block_frames)
+        layers.append((LAYER_GAINS[name], gen))
+
+    total = int(duration * sample_rate)
+    fade = min(int(FADE_SECONDS * sample_rate), total // 2)
+    start = 0
+    while start < total:
+        n = min(block_frames, total - start)
+        mix = np.zeros((block_frames, 2), dtype=np.float32)
+        for gain, gen in layers:
+            mix += gain * next(gen)
+        mix = mix[:n]
+
+        # フェードイン・フェードアウト
+        t = np.arange(start, start + n)
+        gain = np.minimum(np.minimum(t / max(fade, 1), (total - t) / max(fade, 1)), 1.0)
+        mix *= gain[:, None].astype(np.float32)
+
+        # ソフトクリップ
+        yield np.tanh(mix)
+        start += n
+
+
+def render_ambient(prompt, output_path, duration, sample_rate=SAMPLE_RATE, seed=None):
+    """
+    アンビエント音声を生成してWAVに書き出す
+
+    Returns:
+        書き込んだフレーム数
+    """
+    progression, layers = select_layers(prompt)
+    print(f"🎛️  アンビエント合成: 進行={progression} / レイヤー={', '.join(layers)}")
+    blocks = render_blocks(prompt, duration, sample_rate, seed=seed)
+    return write_blocks(output_path, sample_rate, 2, blocks)
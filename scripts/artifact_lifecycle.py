@@ -0,0 +1,240 @@
+"""
+生成物ライフサイクル管理モジュール
+
+機能:
+    - output/ 内の生成物のサイズ・作成ステージ・利用ステージを記録
+    - 全ての利用ステージが使い終わった中間ファイル（WAVなど）を即削除
+    - ディスク使用量の上限を超えたら、使用済みの生成物を古い順に削除（LRU）
+    - 途中で失敗した実行の生成物も、一定時間使われなければ削除対象にする
+    - 生成前に見込みサイズ分の空き容量があるか確認
+
+各スクリプトは別プロセスで動くため、状態は output/artifacts.json に保存する。
+"""
+
+import os
+import json
+import time
+import shutil
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+
+OUTPUT_DIR = Path("output")
+
+MANIFEST_NAME = "artifacts.json"
+
+# output/ の使用量上限（GB）
+DISK_BUDGET_GB = float(os.getenv('OUTPUT_DISK_BUDGET_GB', '5'))
+
+# 利用ステージが残っていても削除してよくなるまでの時間（時間）
+# 途中で失敗した実行の WAV や投稿できなかった MP4 が残り続けないようにする
+STALE_HOURS = float(os.getenv('ARTIFACT_STALE_HOURS', '24'))
+
+# 空き容量チェック時の余裕（バイト）
+FREE_SPACE_MARGIN = 200 * 1024 ** 2
+
+# 生成物の種類
+KIND_INTERMEDIATE = 'intermediate'  # 全ステージが使い終わったら削除
+KIND_OUTPUT = 'output'              # 使い終わった後は上限超過時にLRUで削除
+KIND_CACHE = 'cache'                # 利用ステージに関係なくLRUで削除
+
+# 見込みサイズの計算用
+# WAVはパイプラインの出力レートのまま書き出すので、出しうる最大のレートで見積もる
+# （ACE-Step は 48kHz、デモ音声は 44.1kHz）
+MAX_SAMPLE_RATE = 48000
+AUDIO_BYTES_PER_FRAME = 2 * 2                  # ステレオ / 16bit
+VIDEO_BYTES_PER_SECOND = (192_000 + 400_000) // 8  # AAC 192k + 静止画 H.264
+IMAGE_BYTES = 2 * 1024 ** 2
+
+# 常駐モードでは同じプロセス内の複数ジョブが記録を更新する
+_MANIFEST_LOCK = threading.RLock()
+
+
+def projected_run_bytes(duration, sample_rate=MAX_SAMPLE_RATE):
+    """
+    1回の実行で output/ に同時に存在する生成物の見込みサイズ
+
+    動画作成中は WAV と MP4 が両方残るため、その合計で見積もる。
+
+    Args:
+        duration: 音楽の長さ（秒）
+        sample_rate: WAVのサンプリングレート
+    """
+    wav = duration * sample_rate * AUDIO_BYTES_PER_FRAME
+    mp4 = duration * VIDEO_BYTES_PER_SECOND
+    images = 2 * IMAGE_BYTES  # 背景 + サムネイル
+    return int(wav + mp4 + images)
+
+
+def _format_size(size):
+    return f"{size / 1024 ** 2:.1f}MB"
+
+
+class ArtifactManager:
+    """
+    output/ の生成物を管理するマネージャー
+
+    生成物ごとに 作成ステージ・利用ステージ・使用済みステージ・最終アクセス時刻 を持つ。
+    """
+
+    def __init__(self, output_dir=OUTPUT_DIR, budget_bytes=None):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(exist_ok=True)
+        self.manifest_path = self.output_dir / MANIFEST_NAME
+        if budget_bytes is None:
+            budget_bytes = int(DISK_BUDGET_GB * 1024 ** 3)
+        self.budget_bytes = budget_bytes
+        self.artifacts = self._load()
+
+    def _load(self):
+        """記録を読み込み、既に存在しないファイルのエントリは捨てる"""
+        if not self.manifest_path.exists():
+            return {}
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                artifacts = json.load(f)
+        except (OSError, ValueError):
+            print(f"⚠️  {self.manifest_path} を読み込めません。記録を作り直します")
+            return {}
+        return {name: a for name, a in artifacts.items()
+                if (self.output_dir / name).exists()}
+
+    def _save(self):
+        """記録を保存（書き込み途中で壊れないよう置き換えで保存）"""
+        tmp = self.manifest_path.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.artifacts, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.manifest_path)
+
+    @contextmanager
+    def _transaction(self):
+        """最新の記録を読み直して更新し、保存する"""
+        with _MANIFEST_LOCK:
+            self.artifacts = self._load()
+            yield
+            self._save()
+
+    def _key(self, path):
+        return Path(path).name
+
+    def register(self, path, stage, consumers=(), kind=KIND_OUTPUT):
+        """
+        生成物を登録
+
+        Args:
+            path: 生成物のパス（output/ 直下）
+            stage: 作成したステージ名
+            consumers: この生成物を使うステージ名のリスト
+            kind: KIND_INTERMEDIATE / KIND_OUTPUT / KIND_CACHE
+        """
+        path = Path(path)
+        if not path.exists():
+            return
+
+        now = time.time()
+        with self._transaction():
+            self.artifacts[self._key(path)] = {
+                'size': path.stat().st_size,
+                'stage': stage,
+                'kind': kind,
+                'consumers': list(consumers),
+                'consumed': [],
+                'created': now,
+                'last_access': now,
+            }
+
+    def touch(self, path):
+        """最終アクセス時刻を更新（LRU用）"""
+        with self._transaction():
+            artifact = self.artifacts.get(self._key(path))
+            if artifact is not None:
+                artifact['last_access'] = time.time()
+
+    def consume(self, path, stage):
+        """
+        ステージが生成物を使い終わったことを記録
+
+        中間ファイルは全ての利用ステージが使い終わった時点で削除する。
+        """
+        key = self._key(path)
+        with self._transaction():
+            artifact = self.artifacts.get(key)
+            if artifact is None:
+                return
+
+            if stage not in artifact['consumed']:
+                artifact['consumed'].append(stage)
+            artifact['last_access'] = time.time()
+
+            if artifact['kind'] == KIND_INTERMEDIATE and self._fully_consumed(artifact):
+                self._delete(key, "中間ファイル")
+
+    def _fully_consumed(self, artifact):
+        return all(c in artifact['consumed'] for c in artifact['consumers'])
+
+    def _delete(self, key, reason):
+        artifact = self.artifacts.pop(key)
+        try:
+            (self.output_dir / key).unlink()
+            print(f"🗑️  {reason}を削除: {key} ({_format_size(artifact['size'])})")
+        except FileNotFoundError:
+            pass
+
+    def total_bytes(self):
+        """記録している生成物の合計サイズ"""
+        return sum(a['size'] for a in self.artifacts.values())
+
+    def _evictable(self):
+        """
+        削除してよい生成物を最終アクセスが古い順に返す
+
+        キャッシュ・使用済みの生成物に加え、STALE_HOURS 以上使われていない
+        生成物（失敗した実行の残り）も対象にする。
+        """
+        stale_before = time.time() - STALE_HOURS * 3600
+        candidates = [
+            (a['last_access'], key) for key, a in self.artifacts.items()
+            if a['kind'] == KIND_CACHE
+            or (a['kind'] == KIND_OUTPUT and self._fully_consumed(a))
+            or a['last_access'] < stale_before
+        ]
+        return [key for _, key in sorted(candidates)]
+
+    def enforce_budget(self, reserve=0):
+        """
+        使用量が上限を超えていれば、古い順に削除して上限内に収める
+
+        Args:
+            reserve: これから書き込む見込みサイズ（上限の計算に含める）
+        """
+        with self._transaction():
+            for key in self._evictable():
+                if self.total_bytes() + reserve <= self.budget_bytes:
+                    break
+                self._delete(key, "古い生成物")
+            return self.total_bytes() + reserve <= self.budget_bytes
+
+    def ensure_free_space(self, projected_bytes):
+        """
+        見込みサイズ分の空き容量を確保できるか確認
+
+        足りない場合は使用済みの生成物を古い順に削除してから再確認する。
+        使用量上限を超えるだけなら警告のみで、実際の空き容量で判定する。
+
+        Returns:
+            確保できれば True
+        """
+        if not self.enforce_budget(reserve=projected_bytes):
+            print(f"⚠️  使用量上限 {_format_size(self.budget_bytes)} を超えますが、"
+                  "空き容量があれば続行します")
+
+        needed = projected_bytes + FREE_SPACE_MARGIN
+        with self._transaction():
+            for key in self._evictable():
+                if shutil.disk_usage(self.output_dir).free >= needed:
+                    break
+                self._delete(key, "古い生成物")
+
+        free = shutil.disk_usage(self.output_dir).free
+        print(f"💾 空き容量: {_format_size(free)} / 必要量: {_format_size(needed)}")
+        return free >= needed
@@ -0,0 +1,243 @@
+"""
+WAV入出力モジュール
+
+機能:
+    - WAVをブロック単位で逐次書き込み（ヘッダーはクローズ時に確定）
+    - 既存のWAVを numpy.memmap としてコピーなしで開く
+    - 生成・後処理・特徴量抽出で共通に使えるブロックイテレーター
+"""
+
+import struct
+
+import numpy as np
+
+# WAVフォーマットタグ
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# 書き込み時のサンプル形式: (フォーマットタグ, numpy dtype)
+SAMPLE_FORMATS = {
+    'int16': (WAVE_FORMAT_PCM, np.dtype('<i2')),
+    'float32': (WAVE_FORMAT_IEEE_FLOAT, np.dtype('<f4')),
+}
+
+# 読み込み時に memmap できる形式
+_READ_DTYPES = {
+    (WAVE_FORMAT_PCM, 8): np.dtype('u1'),
+    (WAVE_FORMAT_PCM, 16): np.dtype('<i2'),
+    (WAVE_FORMAT_PCM, 32): np.dtype('<i4'),
+    (WAVE_FORMAT_IEEE_FLOAT, 32): np.dtype('<f4'),
+    (WAVE_FORMAT_IEEE_FLOAT, 64): np.dtype('<f8'),
+}
+
+# 1ブロックあたりのフレーム数（約1秒 @ 44.1kHz）
+DEFAULT_BLOCK_FRAMES = 44100
+
+# RIFFのサイズフィールドは32bit
+_MAX_DATA_BYTES = 0xFFFFFFFF - 36
+
+
+class WavWriter:
+    """
+    WAVをブロック単位で書き込むライター
+
+    書き込み中はサイズ欄を0にしておき、close() でRIFF/dataサイズを書き戻す。
+    全体をメモリに載せずに長時間の音声を保存できる。
+    """
+
+    def __init__(self, path, sample_rate, channels=2, sample_format='int16'):
+        if sample_format not in SAMPLE_FORMATS:
+            raise ValueError(f"未対応のサンプル形式: {sample_format}")
+
+        self.path = path
+        self.sample_rate = int(sample_rate)
+        self.channels = int(channels)
+        self.format_tag, self.dtype = SAMPLE_FORMATS[sample_format]
+        self.frames = 0
+        self._data_bytes = 0
+        self._file = open(path, 'wb')
+        self._write_header()
+
+    def _write_header(self):
+        """ヘッダーを書き込む（サイズ欄は現在の値）"""
+        block_align = self.channels * self.dtype.itemsize
+        self._file.write(b'RIFF')
+        self._file.write(struct.pack('<I', 36 + self._data_bytes))
+        self._file.write(b'WAVE')
+        self._file.write(b'fmt ')
+        self._file.write(struct.pack(
+            '<IHHIIHH',
+            16,
+            self.format_tag,
+            self.channels,
+            self.sample_rate,
+            self.sample_rate * block_align,
+            block_align,
+            self.dtype.itemsize * 8,
+        ))
+        self._file.write(b'data')
+        self._file.write(struct.pack('<I', self._data_bytes))
+
+    def write(self, block):
+        """
+        音声ブロックを追記
+
+        Args:
+            block: (フレーム数, チャンネル数) または (フレーム数,) の配列。
+                   float は [-1, 1] として扱い、必要に応じて変換する。
+        """
+        data = to_sample_format(block, self.dtype)
+        if data.ndim == 1:
+            data = data[:, None]
+        if data.shape[1] != self.channels:
+            raise ValueError(
+                f"チャンネル数が一致しません: {data.shape[1]} != {self.channels}")
+
+        if self._data_bytes + data.nbytes > _MAX_DATA_BYTES:
+            raise ValueError("WAVの最大サイズ(4GB)を超えます")
+
+        self._file.write(np.ascontiguousarray(data).tobytes())
+        self.frames += data.shape[0]
+        self._data_bytes += data.nbytes
+
+    def close(self):
+        """ヘッダーのサイズ欄を確定してファイルを閉じる"""
+        if self._file.closed:
+            return
+        self._file.seek(0)
+        self._write_header()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def to_sample_format(block, dtype):
+    """ブロックを指定のサンプル形式に変換"""
+    data = np.asarray(block)
+    if data.dtype == dtype:
+        return data
+
+    if data.dtype.kind == 'u':
+        # 符号なしPCM（8bit WAVなど）は中央値が 2^(bits-1) なので符号付きに直す
+        offset = 2 ** (data.dtype.itemsize * 8 - 1)
+        data = (data.astype(np.int64) - offset).astype(f'<i{data.dtype.itemsize}')
+
+    if dtype.kind == 'f':
+        if data.dtype.kind == 'f':
+            return data.astype(dtype)
+        # 整数PCM → [-1, 1]
+        scale = float(2 ** (data.dtype.itemsize * 8 - 1))
+        return (data / scale).astype(dtype)
+
+    # → 整数PCM
+    if data.dtype.kind == 'f':
+        scale = float(2 ** (dtype.itemsize * 8 - 1) - 1)
+        return np.clip(data * scale, -scale - 1, scale).astype(dtype)
+
+    # 整数PCM → 整数PCM: ビット深度の差だけシフトしてスケールを合わせる
+    shift = (dtype.itemsize - data.dtype.itemsize) * 8
+    wide = data.astype(np.int64)
+    if shift > 0:
+        wide = wide << shift
+    elif shift < 0:
+        wide = wide >> -shift
+    return wide.astype(dtype)
+
+
+def write_blocks(path, sample_rate, channels, blocks, sample_format='int16'):
+    """
+    ブロックのイテレーターをそのままWAVに書き出す
+
+    Returns:
+        書き込んだフレーム数
+    """
+    with WavWriter(path, sample_rate, channels, sample_format) as writer:
+        for block in blocks:
+            writer.write(block)
+    return writer.frames
+
+
+def _read_chunks(path):
+    """RIFFチャンクを走査して fmt の内容と data の位置を返す"""
+    fmt = None
+    with open(path, 'rb') as f:
+        header = f.read(12)
+        if len(header) < 12 or header[:4] != b'RIFF' or header[8:12] != b'WAVE':
+            raise ValueError(f"WAVファイルではありません: {path}")
+
+        while True:
+            chunk = f.read(8)
+            if len(chunk) < 8:
+                break
+            chunk_id, size = chunk[:4], struct.unpack('<I', chunk[4:])[0]
+
+            if chunk_id == b'fmt ':
+                body = f.read(size)
+                tag, channels, rate, _, _, bits = struct.unpack('<HHIIHH', body[:16])
+                if tag == WAVE_FORMAT_EXTENSIBLE and len(body) >= 26:
+                    tag = struct.unpack('<H', body[24:26])[0]
+                fmt = (tag, channels, rate, bits)
+            elif chunk_id == b'data':
+                if fmt is None:
+                    raise ValueError(f"fmtチャンクがありません: {path}")
+                offset = f.tell()
+                # 書き込み途中のファイルはサイズ欄が0のままなので実サイズで補う
+                f.seek(0, 2)
+                available = f.tell() - offset
+                if size == 0 or size > available:
+                    size = available
+                return fmt, offset, size
+            else:
+                f.seek(size, 1)
+
+            # チャンクは2バイト境界に揃う
+            if size % 2:
+                f.seek(1, 1)
+
+    raise ValueError(f"dataチャンクがありません: {path}")
+
+
+def open_wav(path):
+    """
+    WAVを memmap として開く（読み取り専用・コピーなし）
+
+    Returns:
+        (サンプリングレート, (フレーム数, チャンネル数) の numpy.memmap)
+    """
+    (tag, channels, rate, bits), offset, size = _read_chunks(path)
+    dtype = _READ_DTYPES.get((tag, bits))
+    if dtype is None:
+        raise ValueError(f"未対応のWAV形式です: format={tag}, bits={bits}")
+
+    frames = size // (dtype.itemsize * channels)
+    if frames == 0:
+        return rate, np.zeros((0, channels), dtype=dtype)
+
+    audio = np.memmap(path, dtype=dtype, mode='r', offset=offset,
+                      shape=(frames, channels))
+    return rate, audio
+
+
+def iter_blocks(source, block_frames=DEFAULT_BLOCK_FRAMES):
+    """
+    音声をブロック単位で返すイテレーター
+
+    Args:
+        source: WAVファイルのパス、または (フレーム数, チャンネル数) の配列
+        block_frames: 1ブロックのフレーム数
+
+    Yields:
+        (開始フレーム, ブロック) — ブロックは元データのビュー
+    """
+    if isinstance(source, np.ndarray):
+        audio = source
+    else:
+        _, audio = open_wav(source)
+
+    for start in range(0, len(audio), block_frames):
+        yield start, audio[start:start + block_frames]
@@ -0,0 +1,463 @@
+"""
+BGM生成 常駐サービス (自前のLinuxサーバー用)
+
+機能:
+    - スケジュールファイルに従ってジョブを登録
+    - 優先度付きキュー・同時実行数の制限付きでジョブを実行
+    - 各ステージを同じプロセス内で呼び出し、モデルをロードしたまま使い回す
+    - キューの状態をファイルに保存し、再起動後も続きから実行
+    - ローカルHTTPでキューの長さとジョブごとのステージ時間を公開
+
+使い方 (リポジトリのルートで、ACE-Stepの環境から起動):
+    uv run --project $ACESTEP_DIR python scripts/bgm_daemon.py
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import argparse
+import threading
+import traceback
+from pathlib import Path
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+SCHEDULE_FILE = Path(os.getenv('BGM_SCHEDULE_FILE', 'config/schedule.json'))
+STATE_FILE = Path(os.getenv('BGM_STATE_FILE', 'output/daemon_state.json'))
+
+# スケジュールの実行済み時刻（状態ファイルが壊れても同じ時刻を二重に実行しないよう別に保存）
+FIRED_FILE = Path(os.getenv('BGM_FIRED_FILE', 'output/daemon_fired.json'))
+
+# 各ステージの生成物の置き場所（ファイル名は "<タグ>_*"）
+OUTPUT_DIR = Path("output")
+
+# スケジュールを確認する間隔（秒）
+POLL_SECONDS = 30
+
+# 状態ファイルに残す完了済みジョブ数
+HISTORY_LIMIT = 100
+
+# スケジュールファイルが無い場合の設定（ワークフローの cron と同じ: 月・水・金 9:00 UTC）
+DEFAULT_SCHEDULE = {
+    'entries': [
+        {'name': 'bgm', 'weekdays': [0, 2, 4], 'time': '09:00', 'priority': 0},
+    ],
+    'max_jobs': 1,
+    'stage_limits': {'music': 1, 'background': 1, 'video': 1, 'upload': 1},
+    'status_host': '127.0.0.1',
+    'status_port': 8765,
+}
+
+# モデルをプロセス内で1つだけ共有するステージ（パイプラインはスレッドセーフではない）
+SINGLE_INSTANCE_STAGES = ('music', 'background')
+
+# パイプラインのステージ: (ステージ名, モジュール名)
+STAGES = [
+    ('music', 'generate_music_fixed'),
+    ('background', 'generate_background'),
+    ('video', 'create_video'),
+    ('upload', 'upload_youtube'),
+]
+
+# ジョブの状態
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def load_schedule(path=SCHEDULE_FILE):
+    """スケジュールファイルを読み込み（無い項目はデフォルト値）"""
+    schedule = dict(DEFAULT_SCHEDULE)
+    if path.exists():
+        with open(path, 'r', encoding='utf-8') as f:
+            schedule.update(json.load(f))
+    else:
+        print(f"⚠️  {path} が見つかりません。デフォルトのスケジュールを使用します")
+
+    for stage in SINGLE_INSTANCE_STAGES:
+        if schedule['stage_limits'].get(stage, 1) > 1:
+            raise ValueError(
+                f"stage_limits.{stage} は 1 までです（モデルを複数ジョブで共有できないため）")
+    return schedule
+
+
+def _now():
+    return datetime.now(timezone.utc)
+
+
+def _timestamp():
+    return time.time()
+
+
+class JobQueue:
+    """
+    優先度付きのジョブキュー
+
+    優先度が高い順、同じ優先度なら登録が古い順に取り出す。
+    変更のたびに状態ファイルへ保存する。
+    """
+
+    def __init__(self, state_file=STATE_FILE, fired_file=FIRED_FILE):
+        self.state_file = Path(state_file)
+        self.fired_file = Path(fired_file)
+        self.lock = threading.Lock()
+        self.jobs = []
+        self.last_fired = {}
+        self._load()
+
+    def _read_json(self, path):
+        """JSONファイルを読み込む（壊れていれば退避して None を返す）"""
+        if not path.exists():
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            backup = path.with_suffix('.corrupt')
+            os.replace(path, backup)
+            print(f"⚠️  {path} を読み込めません。{backup} に退避しました")
+            return None
+
+    def _load(self):
+        """
+        状態ファイルを読み込み、中断されたジョブを再開できるようにする
+
+        完了済みのステージは残して続きから実行する。
+        アップロードを始めていたジョブは二重投稿を避けるため自動では再実行せず、
+        要確認として失敗扱いにする。
+        """
+        state = self._read_json(self.state_file) or {}
+        self.jobs = state.get('jobs', [])
+        fired = self._read_json(self.fired_file)
+        self.last_fired = fired if fired is not None else state.get('last_fired', {})
+
+        for job in self.jobs:
+            if job['status'] != RUNNING:
+                continue
+            if 'upload' in job['stages']:
+                print(f"⚠️  アップロード中に中断されたジョブ（要確認）: {job['id']}")
+                job['status'] = FAILED
+                job['error'] = "アップロード中に中断されました。投稿済みか確認してください"
+                continue
+            print(f"🔁 中断されたジョブを再登録: {job['id']}")
+            job['status'] = QUEUED
+            job['stages'] = {stage: record for stage, record in job['stages'].items()
+                             if record.get('status') == DONE}
+
+    def _save(self):
+        """状態を保存（呼び出し側でロックを持つこと）"""
+        finished = [j for j in self.jobs if j['status'] in (DONE, FAILED)]
+        if len(finished) > HISTORY_LIMIT:
+            drop = {j['id'] for j in finished[:len(finished) - HISTORY_LIMIT]}
+            self.jobs = [j for j in self.jobs if j['id'] not in drop]
+
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.state_file.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'jobs': self.jobs, 'last_fired': self.last_fired},
+                      f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.state_file)
+
+    def _save_fired(self):
+        """実行済み時刻を保存（呼び出し側でロックを持つこと）"""
+        self.fired_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.fired_file.with_suffix('.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.last_fired, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.fired_file)
+
+    def _tag_used(self, tag):
+        """タグが記録済みのジョブか、output/ に残っている生成物で使われているか"""
+        if any(j['tag'] == tag for j in self.jobs):
+            return True
+        return any(OUTPUT_DIR.glob(f"{tag}_*"))
+
+    def _new_tag(self, date):
+        """生成物のファイル名に使うタグ（同じ日の2件目以降は連番付き）"""
+        if not self._tag_used(date):
+            return date
+        n = 2
+        while self._tag_used(f"{date}-{n}"):
+            n += 1
+        return f"{date}-{n}"
+
+    def submit(self, name, priority=0):
+        """ジョブを登録"""
+        with self.lock:
+            tag = self._new_tag(_now().strftime('%Y-%m-%d'))
+            job = {
+                'id': tag,
+                'tag': tag,
+                'name': name,
+                'priority': priority,
+                'status': QUEUED,
+                'submitted': _timestamp(),
+                'started': None,
+                'finished': None,
+                'stages': {},
+                'error': None,
+            }
+            self.jobs.append(job)
+            self._save()
+        print(f"📥 ジョブ登録: {job['id']} ({name}, 優先度 {priority})")
+        return job
+
+    def take(self):
+        """次に実行するジョブを取り出して実行中にする"""
+        with self.lock:
+            queued = [j for j in self.jobs if j['status'] == QUEUED]
+            if not queued:
+                return None
+            job = min(queued, key=lambda j: (-j['priority'], j['submitted']))
+            job['status'] = RUNNING
+            job['started'] = _timestamp()
+            self._save()
+            return job
+
+    def update(self, job, **fields):
+        """ジョブの項目を更新して保存"""
+        with self.lock:
+            job.update(fields)
+            self._save()
+
+    def set_stage(self, job, stage, **fields):
+        """ステージの記録を更新して保存"""
+        with self.lock:
+            job['stages'].setdefault(stage, {}).update(fields)
+            self._save()
+
+    def mark_fired(self, entry_name, slot):
+        """スケジュールの実行済み時刻を記録"""
+        with self.lock:
+            self.last_fired[entry_name] = slot
+            self._save_fired()
+            self._save()
+
+    def snapshot(self):
+        """ステータス表示用のコピー"""
+        with self.lock:
+            jobs = json.loads(json.dumps(self.jobs))
+        return {
+            'queue_depth': sum(1 for j in jobs if j['status'] == QUEUED),
+            'running': [j['id'] for j in jobs if j['status'] == RUNNING],
+            'jobs': jobs,
+        }
+
+
+def due_slot(entry, now, last_fired):
+    """
+    スケジュール項目の今日の実行時刻が来ていれば、その時刻（ISO形式）を返す
+
+    当日中であれば、停止中に過ぎた時刻も起動後に一度だけ実行する。
+    """
+    if now.weekday() not in entry['weekdays']:
+        return None
+
+    hour, minute = (int(x) for x in entry['time'].split(':'))
+    slot = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+    if now < slot:
+        return None
+
+    slot_iso = slot.isoformat()
+    if last_fired is not None and last_fired >= slot_iso:
+        return None
+    return slot_iso
+
+
+class Daemon:
+    """スケジューラー・ワーカー・ステータスサーバーをまとめた常駐サービス"""
+
+    def __init__(self, schedule, queue):
+        self.schedule = schedule
+        self.queue = queue
+        self.stop_event = threading.Event()
+        self.job_slots = threading.Semaphore(schedule['max_jobs'])
+        self.stage_locks = {
+            stage: threading.Semaphore(schedule['stage_limits'].get(stage, 1))
+            for stage, _ in STAGES
+        }
+        self.modules = {}
+
+    def warm_up(self):
+        """ステージのモジュールを読み込み、重いモデルを事前にロード"""
+        import sharded_generation
+        sharded_generation.keep_workers_warm()
+
+        for stage, module_name in STAGES:
+            try:
+                self.modules[stage] = __import__(module_name)
+            except Exception as e:
+                print(f"⚠️  {module_name} を読み込めません: {e}")
+
+        # 親プロセスに残る Stable Diffusion を先にロードし、
+        # シャーディング用ワーカー数はその分を除いた空きメモリから決める
+        background = self.modules.get('background')
+        if background is not None:
+            try:
+                background.get_pipeline()
+            except Exception as e:
+                print(f"⚠️  Stable Diffusionを事前ロードできません: {e}")
+
+        music = self.modules.get('music')
+        if music is not None:
+            try:
+                # generate_with_acestep と同じ条件で、実際に使う方をロードする
+                device = music.get_device()
+                if music.use_sharded(device, music.MUSIC_DURATION):
+                    workers = sharded_generation.start_workers(
+                        music.ACESTEP_DIR / "checkpoints", music.MUSIC_DURATION)
+                    print(f"🧩 シャーディング用ワーカー {workers} 個を起動しました")
+                else:
+                    music.get_pipeline(device)
+            except Exception as e:
+                print(f"⚠️  ACE-Stepを事前ロードできません: {e}")
+
+    def run_stage(self, job, stage):
+        """1ステージを実行して所要時間を記録"""
+        module = self.modules.get(stage)
+        if module is None:
+            raise RuntimeError(f"ステージ {stage} のモジュールがありません")
+
+        with self.stage_locks[stage]:
+            start = _timestamp()
+            self.queue.set_stage(job, stage, status=RUNNING, started=start)
+            try:
+                module.main(today=job['tag'])
+            except SystemExit as e:
+                # 各スクリプトは失敗時に sys.exit(1) する
+                if e.code not in (None, 0):
+                    raise RuntimeError(f"ステージ {stage} が失敗しました (exit {e.code})") from None
+            finally:
+                end = _timestamp()
+                self.queue.set_stage(job, stage, finished=end,
+                                     seconds=round(end - start, 2))
+            self.queue.set_stage(job, stage, status=DONE)
+
+    def run_job(self, job):
+        """ジョブの全ステージを順番に実行（完了済みのステージは飛ばす）"""
+        print(f"▶️  ジョブ開始: {job['id']}")
+        stage = None
+        try:
+            for stage, _ in STAGES:
+                if job['stages'].get(stage, {}).get('status') == DONE:
+                    print(f"⏭️  {stage} は完了済みのため飛ばします")
+                    continue
+                self.run_stage(job, stage)
+            self.queue.update(job, status=DONE, finished=_timestamp())
+            print(f"✅ ジョブ完了: {job['id']}")
+        except Exception as e:
+            if stage is not None:
+                self.queue.set_stage(job, stage, status=FAILED)
+            self.queue.update(job, status=FAILED, finished=_timestamp(), error=str(e))
+            print(f"❌ ジョブ失敗: {job['id']}: {e}")
+            traceback.print_exc()
+        finally:
+            self.job_slots.release()
+
+    def check_schedule(self):
+        """実行時刻が来たスケジュール項目のジョブを登録"""
+        now = _now()
+        for entry in self.schedule['entries']:
+            name = entry['name']
+            slot = due_slot(entry, now, self.queue.last_fired.get(name))
+            if slot is not None:
+                self.queue.submit(name, entry.get('priority', 0))
+                self.queue.mark_fired(name, slot)
+
+    def dispatch(self):
+        """空きがある限りキューからジョブを取り出して実行"""
+        while self.job_slots.acquire(blocking=False):
+            job = self.queue.take()
+            if job is None:
+                self.job_slots.release()
+                return
+            threading.Thread(target=self.run_job, args=(job,),
+                             name=f"job-{job['id']}", daemon=True).start()
+
+    def serve_status(self):
+        """ステータス用HTTPサーバーを起動"""
+        queue = self.queue
+
+        class StatusHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path in ('/', '/status'):
+                    body = json.dumps(queue.snapshot(), ensure_ascii=False, indent=2)
+                    self._reply(200, body)
+                elif self.path == '/healthz':
+                    self._reply(200, json.dumps({'ok': True}))
+                else:
+                    self._reply(404, json.dumps({'error': 'not found'}))
+
+            def _reply(self, code, body):
+                data = body.encode('utf-8')
+                self.send_response(code)
+                self.send_header('Content-Type', 'application/json; charset=utf-8')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        host = self.schedule['status_host']
+        port = self.schedule['status_port']
+        server = ThreadingHTTPServer((host, port), StatusHandler)
+        threading.Thread(target=server.serve_forever, name='status', daemon=True).start()
+        print(f"📊 ステータス: http://{host}:{port}/status")
+        return server
+
+    def run(self):
+        """メインループ"""
+        server = self.serve_status()
+        try:
+            while not self.stop_event.is_set():
+                self.check_schedule()
+                self.dispatch()
+                self.stop_event.wait(POLL_SECONDS)
+        finally:
+            server.shutdown()
+
+
+def main():
+    """メイン処理"""
+    parser = argparse.ArgumentParser(description="BGM生成 常駐サービス")
+    parser.add_argument('--run-now', action='store_true',
+                        help="起動時にジョブを1件登録する")
+    parser.add_argument('--priority', type=int, default=0,
+                        help="--run-now で登録するジョブの優先度")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("🛰️  BGM生成 常駐サービス")
+    print("=" * 60)
+
+    try:
+        schedule = load_schedule()
+    except ValueError as e:
+        print(f"❌ スケジュール設定エラー: {e}")
+        sys.exit(1)
+    queue = JobQueue()
+    daemon = Daemon(schedule, queue)
+
+    print("🔥 モデルを事前ロード中...")
+    daemon.warm_up()
+
+    if args.run_now:
+        queue.submit('manual', args.priority)
+    
+    # systemd などからの停止要求
+    signal.signal(signal.SIGTERM, lambda *_: daemon.stop_event.set())
+
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        print("")
+        print("👋 停止します（実行中のジョブは次回起動時に続きから実行されます）")
+        sys.exit(0)
+
+
+if __name__ == '__main__':
+    main()
@@ -14,6 +14,8 @@ from pathlib import Path
 from datetime import datetime
 from PIL import Image, ImageDraw, ImageFont
 
+from artifact_lifecycle import ArtifactManager
+
 OUTPUT_DIR = Path("output")
 
 def create_video(audio_path, background_path, output_path):
@@ -143,9 +145,10 @@ def create_thumbnail(background_path, title, output_path):
         img.save(output_path)
         return True
 
-def read_metadata():
+def read_metadata(today=None):
     """メタデータから情報を取得"""
-    today = datetime.now().strftime('%Y-%m-%d')
+    if today is None:
+        today = datetime.now().strftime('%Y-%m-%d')
     metadata_file = OUTPUT_DIR / f"{today}_metadata.txt"
     
     metadata = {}
@@ -158,14 +161,20 @@ def read_metadata():
     
     return metadata
 
-def main():
-    """メイン処理"""
+def main(today=None):
+    """
+    メイン処理
+    
+    Args:
+        today: 生成物ファイル名の日付部分（省略時は今日）
+    """
     print("=" * 60)
     print("🎬 動画作成 & サムネイル生成")
     print("=" * 60)
     
     # ファイルパス
-    today = datetime.now().strftime('%Y-%m-%d')
+    if today is None:
+        today = datetime.now().strftime('%Y-%m-%d')
     audio_path = OUTPUT_DIR / f"{today}_bgm.wav"
     background_path = OUTPUT_DIR / f"{today}_background.jpg"
     video_path = OUTPUT_DIR / f"{today}_video.mp4"
@@ -181,7 +190,7 @@ def main():
         sys.exit(1)
     
     # メタデータ取得
-    metadata = read_metadata()
+    metadata = read_metadata(today)
     title = metadata.get('prompt', 'Chill BGM')
     
     # 動画作成
@@ -191,6 +200,15 @@ def main():
     success_thumbnail = create_thumbnail(background_path, title, thumbnail_path)
     
     if success_video and success_thumbnail:
+        # 使い終わった入力を記録（WAVはここで削除される）
+        artifacts = ArtifactManager(OUTPUT_DIR)
+        artifacts.consume(audio_path, 'video')
+        artifacts.consume(background_path, 'video')
+        artifacts.consume(OUTPUT_DIR / f"{today}_metadata.txt", 'video')
+        artifacts.register(video_path, 'video', consumers=['upload'])
+        artifacts.register(thumbnail_path, 'video', consumers=['upload'])
+        artifacts.enforce_budget()
+        
         print("")
         print("✅ 全ての処理が完了しました！")
         print(f"📁 動画: {video_path}")
@@ -13,11 +13,17 @@ from pathlib import Path
 from datetime import datetime
 import torch
 
+from artifact_lifecycle import ArtifactManager
+
 OUTPUT_DIR = Path("output")
 
-def read_metadata():
+# 常駐モードで使い回すパイプライン
+_pipe = None
+
+def read_metadata(today=None):
     """メタデータから音楽プロンプトを読み込み"""
-    today = datetime.now().strftime('%Y-%m-%d')
+    if today is None:
+        today = datetime.now().strftime('%Y-%m-%d')
     metadata_file = OUTPUT_DIR / f"{today}_metadata.txt"
     
     if not metadata_file.exists():
@@ -57,21 +63,14 @@ def create_image_prompt(music_prompt):
     # デフォルト
     return f"abstract ambient background, soft colors, peaceful, {base_prompt}"
 
-def generate_background(prompt, output_path):
-    """
-    Stable Diffusionで背景画像を生成
-    
-    Args:
-        prompt: 画像生成プロンプト
-        output_path: 出力先パス
-    """
-    print(f"🖼️  背景画像生成開始")
-    print(f"📝 プロンプト: {prompt}")
+def get_pipeline():
+    """Stable Diffusionパイプラインを取得（常駐モードではロード済みを使い回す）"""
+    global _pipe
+    device = "cuda" if torch.cuda.is_available() else "cpu"
     
-    try:
+    if _pipe is None:
         from diffusers import StableDiffusionPipeline
         
-        # モデルロード
         print("📦 Stable Diffusionモデルをロード中...")
         
         # SDXL Turboを使用（高速生成）
@@ -82,8 +81,24 @@ def generate_background(prompt, output_path):
         )
         
         # CPUまたはGPUに移動
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        pipe = pipe.to(device)
+        _pipe = pipe.to(device)
+    
+    return _pipe, device
+
+def generate_background(prompt, output_path):
+    """
+    Stable Diffusionで背景画像を生成
+    
+    Args:
+        prompt: 画像生成プロンプト
+        output_path: 出力先パス
+    """
+    print(f"🖼️  背景画像生成開始")
+    print(f"📝 プロンプト: {prompt}")
+    
+    try:
+        # モデルロード（ロード済みなら再利用）
+        pipe, device = get_pipeline()
         
         print(f"🖥️  デバイス: {device}")
         
@@ -128,14 +143,21 @@ def generate_solid_background(output_path):
     img.save(output_path)
     print(f"✅ フォールバック背景生成完了: {output_path}")
 
-def main():
-    """メイン処理"""
+def main(today=None):
+    """
+    メイン処理
+    
+    Args:
+        today: 生成物ファイル名の日付部分（省略時は今日）
+    """
     print("=" * 60)
     print("🖼️  Stable Diffusion 背景画像生成")
     print("=" * 60)
     
     # メタデータから音楽プロンプトを取得
-    music_prompt = read_metadata()
+    if today is None:
+        today = datetime.now().strftime('%Y-%m-%d')
+    music_prompt = read_metadata(today)
     print(f"🎵 音楽プロンプト: {music_prompt}")
     
     # 画像プロンプトを生成
@@ -143,13 +165,17 @@ def main():
     print(f"🎨 画像プロンプト: {image_prompt}")
     
     # 出力パス
-    today = datetime.now().strftime('%Y-%m-%d')
     output_path = OUTPUT_DIR / f"{today}_background.jpg"
     
     # 背景画像生成
     success = generate_background(image_prompt, output_path)
     
     if success:
+        # 生成物を登録（背景は動画とサムネイルに使用）
+        artifacts = ArtifactManager(OUTPUT_DIR)
+        artifacts.consume(OUTPUT_DIR / f"{today}_metadata.txt", 'background')
+        artifacts.register(output_path, 'background', consumers=['video'])
+        
         print("")
         print("✅ 背景画像生成完了！")
         print(f"📁 出力: {output_path}")
@@ -13,6 +13,13 @@ from pathlib import Path
 from datetime import datetime
 import random
 
+import numpy as np
+
+from audio_io import DEFAULT_BLOCK_FRAMES, write_blocks, iter_blocks
+from ambient_synth import SAMPLE_RATE, render_ambient
+from sharded_generation import generate_sharded, can_shard
+from artifact_lifecycle import ArtifactManager, KIND_INTERMEDIATE, projected_run_bytes
+
 # ACE-Stepのパスを環境変数から取得
 ACESTEP_DIR = Path(os.getenv('ACESTEP_DIR', '../ACE-Step-1.5'))
 sys.path.insert(0, str(ACESTEP_DIR))
@@ -23,6 +30,16 @@ OUTPUT_DIR.mkdir(exist_ok=True)
 
 PROMPTS_FILE = Path("prompts/music_prompts.txt")
 
+# 生成する音楽の長さ（秒）。1時間の動画なら 3600
+MUSIC_DURATION = int(os.getenv('MUSIC_DURATION_SECONDS', '60'))
+
+# CPU実行時のシャーディング生成（ACESTEP_SHARDED=0 で無効化）
+SHARDED_ENABLED = os.getenv('ACESTEP_SHARDED', '1') != '0'
+
+# 常駐モードで使い回すパイプラインと実行デバイス
+_pipeline = None
+_device = None
+
 def load_prompts():
     """プロンプトファイルから読み込み"""
     if not PROMPTS_FILE.exists():
@@ -38,6 +55,30 @@ def select_prompt(prompts):
     """ランダムにプロンプトを選択"""
     return random.choice(prompts)
 
+def get_device():
+    """実行デバイスを判定（結果はプロセス内で使い回す）"""
+    global _device
+    if _device is None:
+        _device = "cuda" if os.system("nvidia-smi") == 0 else "cpu"
+    return _device
+
+def get_pipeline(device):
+    """ACE-Stepパイプラインを取得（ロード済みなら使い回す）"""
+    global _pipeline
+    if _pipeline is None:
+        from acestep.acestep_v15_pipeline import AceStepV15Pipeline
+        
+        print("📦 ACE-Stepパイプラインをロード中...")
+        _pipeline = AceStepV15Pipeline(
+            checkpoint_dir=str(ACESTEP_DIR / "checkpoints"),
+            device=device,
+        )
+    return _pipeline
+
+def use_sharded(device, duration):
+    """シャーディング生成を使うか判定（CPUで長尺、かつメモリが足りる場合）"""
+    return device == "cpu" and SHARDED_ENABLED and can_shard(duration)
+
 def generate_with_acestep(prompt, output_path, duration=60):
     """
     ACE-Stepで音楽生成
@@ -55,27 +96,36 @@ def generate_with_acestep(prompt, output_path, duration=60):
         # ACE-Step 1.5のモジュールをインポート
         from acestep.acestep_v15_pipeline import AceStepV15Pipeline
         
-        print("📦 ACE-Stepパイプラインをロード中...")
+        device = get_device()
         
-        # パイプラインの初期化
-        pipeline = AceStepV15Pipeline(
-            checkpoint_dir=str(ACESTEP_DIR / "checkpoints"),
-            device="cuda" if os.system("nvidia-smi") == 0 else "cpu",
-        )
-        
-        print("🎨 音楽生成中...")
-        
-        # 音楽生成
-        result = pipeline.generate(
-            prompt=prompt,
-            duration=duration,
-            guidance_scale=3.5,
-            num_inference_steps=50,
-        )
-        
-        # WAVファイルとして保存
-        import scipy.io.wavfile as wavfile
-        wavfile.write(str(output_path), result['sample_rate'], result['audio'])
+        if use_sharded(device, duration):
+            # CPU: セグメントに分割してプロセスプールで並列生成
+            print("🎨 音楽生成中 (CPUシャーディング)...")
+            generate_sharded(
+                prompt=prompt,
+                duration=duration,
+                checkpoint_dir=ACESTEP_DIR / "checkpoints",
+                output_path=output_path,
+            )
+        else:
+            # パイプラインの初期化（ロード済みなら再利用）
+            pipeline = get_pipeline(device)
+            
+            print("🎨 音楽生成中...")
+            
+            # 音楽生成
+            result = pipeline.generate(
+                prompt=prompt,
+                duration=duration,
+                guidance_scale=3.5,
+                num_inference_steps=50,
+            )
+            
+            # WAVファイルとしてブロック単位で保存
+            audio = np.asarray(result['audio'])
+            channels = audio.shape[1] if audio.ndim > 1 else 1
+            write_blocks(output_path, result['sample_rate'], channels,
+                         (block for _, block in iter_blocks(audio)))
         
         print(f"✅ 音楽生成完了: {output_path}")
         return True
@@ -83,53 +133,43 @@ def generate_with_acestep(prompt, output_path, duration=60):
     except ImportError as e:
         print(f"⚠️  ACE-Stepインポートエラー: {e}")
         print("フォールバック: デモ音声を生成します")
-        generate_demo_audio(output_path, duration)
+        generate_demo_audio(output_path, duration, prompt)
         return True
         
     except Exception as e:
         print(f"❌ 音楽生成エラー: {e}")
         print("フォールバック: デモ音声を生成します")
-        generate_demo_audio(output_path, duration)
+        generate_demo_audio(output_path, duration, prompt)
         return True
 
-def generate_demo_audio(output_path, duration):
+def generate_demo_audio(output_path, duration, prompt=""):
     """デモ用の音声を生成（フォールバック）"""
-    import subprocess
-    
     print("🎼 デモ音声生成中...")
     
-    # ffmpegで簡単な音を生成
-    cmd = [
-        "ffmpeg", "-f", "lavfi",
-        "-i", f"sine=frequency=440:duration={duration}",
-        "-ar", "44100",
-        "-ac", "2",
-        str(output_path)
-    ]
-    
+    # NumPyでプロンプトに合わせたアンビエント音声を合成
     try:
-        subprocess.run(cmd, check=True, capture_output=True)
+        render_ambient(prompt, output_path, duration)
         print(f"✅ デモ音声ファイル生成: {output_path}")
     except Exception as e:
         print(f"❌ デモ音声生成エラー: {e}")
         # 最後の手段: 無音ファイル
-        cmd = [
-            "ffmpeg", "-f", "lavfi",
-            "-i", f"anullsrc=r=44100:cl=stereo",
-            "-t", str(duration),
-            "-acodec", "pcm_s16le",
-            str(output_path)
-        ]
-        subprocess.run(cmd, check=True)
-
-def save_metadata(prompt):
+        frames = int(duration * SAMPLE_RATE)
+        silence = (
+            np.zeros((min(DEFAULT_BLOCK_FRAMES, frames - start), 2), dtype=np.int16)
+            for start in range(0, frames, DEFAULT_BLOCK_FRAMES)
+        )
+        write_blocks(output_path, SAMPLE_RATE, 2, silence)
+
+def save_metadata(prompt, today=None, duration=MUSIC_DURATION):
     """メタデータを保存"""
-    today = datetime.now().strftime('%Y-%m-%d')
+    date = datetime.now().strftime('%Y-%m-%d')
+    if today is None:
+        today = date
     
     metadata = {
-        'date': today,
+        'date': date,
         'prompt': prompt,
-        'duration': 60,
+        'duration': duration,
         'model': 'ACE-Step 1.5'
     }
     
@@ -139,9 +179,15 @@ def save_metadata(prompt):
             f.write(f"{key}: {value}\n")
     
     print(f"✅ メタデータ保存: {metadata_file}")
+    return metadata_file
 
-def main():
-    """メイン処理"""
+def main(today=None):
+    """
+    メイン処理
+    
+    Args:
+        today: 生成物ファイル名の日付部分（省略時は今日）
+    """
     print("=" * 60)
     print("🎵 ACE-Step 音楽生成 (GitHub Actions)")
     print("=" * 60)
@@ -154,16 +200,30 @@ def main():
     prompt = select_prompt(prompts)
     
     # 出力ファイル名
-    today = datetime.now().strftime('%Y-%m-%d')
+    if today is None:
+        today = datetime.now().strftime('%Y-%m-%d')
     output_filename = f"{today}_bgm.wav"
     output_path = OUTPUT_DIR / output_filename
+    duration = MUSIC_DURATION
+    
+    # 空き容量チェック（不足時は使用済みの古い生成物を削除）
+    artifacts = ArtifactManager(OUTPUT_DIR)
+    if not artifacts.ensure_free_space(projected_run_bytes(duration)):
+        print("❌ ディスクの空き容量が不足しています")
+        sys.exit(1)
     
     # 音楽生成
-    success = generate_with_acestep(prompt, output_path, duration=60)
+    success = generate_with_acestep(prompt, output_path, duration=duration)
     
     if success:
         # メタデータ保存
-        save_metadata(prompt)
+        metadata_file = save_metadata(prompt, today, duration)
+        
+        # 生成物を登録（WAVは動画作成後に削除）
+        artifacts.register(output_path, 'music', consumers=['video'],
+                           kind=KIND_INTERMEDIATE)
+        artifacts.register(metadata_file, 'music',
+                           consumers=['background', 'video', 'upload'])
         
         print("")
         print("✅ 音楽生成完了！")
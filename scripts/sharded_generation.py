@@ -0,0 +1,344 @@
+"""
+ACE-Step CPUシャーディング生成モジュール
+
+機能:
+    - 長時間の音楽を独立したセグメントに分割
+    - プロセスプールで並列生成（ワーカーごとにモデル1つ・スレッド数固定）
+    - CPUコア数と空きメモリからワーカー数を決定
+    - セグメントを順番通りにクロスフェードで連結
+"""
+
+import os
+import itertools
+import collections
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from audio_io import WavWriter
+
+# セグメント長（秒）
+SEGMENT_SECONDS = float(os.getenv('ACESTEP_SEGMENT_SECONDS', '120'))
+
+# セグメント間のクロスフェード長（秒）
+CROSSFADE_SECONDS = float(os.getenv('ACESTEP_CROSSFADE_SECONDS', '4'))
+
+# ワーカー1つあたりの想定メモリ使用量（GB）: モデル + 推論時の作業領域
+WORKER_MEMORY_GB = float(os.getenv('ACESTEP_WORKER_MEMORY_GB', '6'))
+
+# OS・親プロセス用に残しておくメモリ（GB）
+RESERVED_MEMORY_GB = 1.0
+
+# ワーカープロセス内で保持するパイプライン
+_worker_pipeline = None
+
+# 常駐モードで使い回すワーカープール: (プール, チェックポイント, ワーカー数, スレッド数)
+_warm_pool = None
+_keep_warm = False
+
+
+def available_memory_bytes():
+    """利用可能なメモリ量を取得（/proc/meminfo の MemAvailable）"""
+    try:
+        with open('/proc/meminfo', 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    # /proc が無い環境: 物理メモリ総量で代用
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def available_cpu_count():
+    """このプロセスが使えるCPUコア数を取得"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def plan_workers(num_segments):
+    """
+    ワーカー数とワーカーごとのスレッド数を決定
+
+    メモリが足りない場合はワーカー数を減らし、決して超過させない。
+    ワーカー1つ分のメモリも無い場合はワーカー数0を返す。
+
+    Args:
+        num_segments: 生成するセグメント数
+
+    Returns:
+        (ワーカー数, ワーカーごとのスレッド数)
+    """
+    cores = available_cpu_count()
+    workers = min(cores, num_segments)
+
+    mem = available_memory_bytes()
+    if mem is not None:
+        usable = mem - RESERVED_MEMORY_GB * 1024 ** 3
+        by_memory = int(usable // (WORKER_MEMORY_GB * 1024 ** 3))
+        workers = min(workers, max(by_memory, 0))
+
+    if workers == 0:
+        return 0, 0
+    threads = max(cores // workers, 1)
+    return workers, threads
+
+
+def can_shard(duration):
+    """
+    シャーディング生成を使えるか判定
+
+    セグメントが2つ以上になり、ワーカー1つ分以上のメモリがある場合のみ True。
+    """
+    if duration <= SEGMENT_SECONDS:
+        return False
+    if _warm_pool is not None:
+        return True
+    workers, _ = plan_workers(len(plan_segments(duration)))
+    return workers > 0
+
+
+def plan_segments(duration, segment_seconds=SEGMENT_SECONDS, crossfade=CROSSFADE_SECONDS):
+    """
+    生成時間をセグメントに分割
+
+    各セグメントは次のセグメントとクロスフェードする分だけ長めに生成する。
+
+    Args:
+        duration: 全体の長さ（秒）
+        segment_seconds: セグメント長（秒）
+        crossfade: クロスフェード長（秒）
+
+    Returns:
+        各セグメントの生成時間（秒）のリスト
+    """
+    count = max(int(np.ceil(duration / segment_seconds)), 1)
+    base = duration / count
+    lengths = []
+    for i in range(count):
+        length = base
+        if i < count - 1:
+            length += crossfade
+        lengths.append(length)
+    return lengths
+
+
+def _init_worker(checkpoint_dir, num_threads):
+    """ワーカー初期化: スレッド数を固定してモデルを1度だけロード"""
+    global _worker_pipeline
+
+    # torch の内部スレッドプールより先に環境変数で固定する
+    os.environ['OMP_NUM_THREADS'] = str(num_threads)
+    os.environ['MKL_NUM_THREADS'] = str(num_threads)
+
+    import torch
+    torch.set_num_threads(num_threads)
+    torch.set_num_interop_threads(1)
+
+    from acestep.acestep_v15_pipeline import AceStepV15Pipeline
+    _worker_pipeline = AceStepV15Pipeline(
+        checkpoint_dir=checkpoint_dir,
+        device="cpu",
+    )
+
+
+def _ping():
+    """ワーカーの起動（= モデルのロード）完了を待つための空タスク"""
+    return os.getpid()
+
+
+def start_workers(checkpoint_dir, duration):
+    """
+    ワーカープールを起動して全ワーカーにモデルをロードさせる（常駐モードの事前ロード用）
+
+    keep_workers_warm() を有効にしてから呼ぶこと。
+    """
+    pool, workers, _ = _acquire_pool(checkpoint_dir, len(plan_segments(duration)))
+    # 初期化中のワーカーは空きにならないので、ワーカー数分投げれば全員が起動する
+    for future in [pool.submit(_ping) for _ in range(workers)]:
+        future.result()
+    return workers
+
+
+def _generate_segment(index, prompt, duration, seed):
+    """ワーカー内で1セグメントを生成"""
+    import torch
+    torch.manual_seed(seed)
+
+    result = _worker_pipeline.generate(
+        prompt=prompt,
+        duration=duration,
+        guidance_scale=3.5,
+        num_inference_steps=50,
+    )
+    audio = np.asarray(result['audio'], dtype=np.float32)
+    return index, result['sample_rate'], audio
+
+
+def write_crossfaded(segments, writer, sample_rate, crossfade=CROSSFADE_SECONDS):
+    """
+    セグメントを等パワークロスフェードで連結しながら書き出す
+
+    保持するのはクロスフェード分の末尾だけで、全体を連結した配列は作らない。
+
+    Args:
+        segments: 順番通りの音声配列のイテレーター（時間軸が0番目）
+        writer: audio_io.WavWriter
+        sample_rate: サンプリングレート
+        crossfade: クロスフェード長（秒）
+    """
+    fade = int(crossfade * sample_rate)
+    tail = None
+    for seg in segments:
+        if tail is not None:
+            n = min(fade, len(tail), len(seg))
+            t = np.linspace(0.0, np.pi / 2, n, dtype=np.float32)
+            fade_out = np.cos(t)
+            fade_in = np.sin(t)
+            if seg.ndim > 1:
+                fade_out = fade_out[:, None]
+                fade_in = fade_in[:, None]
+
+            writer.write(tail[:len(tail) - n])
+            writer.write(tail[len(tail) - n:] * fade_out + seg[:n] * fade_in)
+            seg = seg[n:]
+
+        # 次のセグメントと重ねる末尾を残して書き出す
+        keep = min(fade, len(seg))
+        writer.write(seg[:len(seg) - keep])
+        tail = seg[len(seg) - keep:]
+
+    if tail is not None:
+        writer.write(tail)
+
+
+def keep_workers_warm(enabled=True):
+    """
+    ワーカープールを生成後も残すかどうかを設定（常駐モード用）
+
+    有効にすると、次回以降の生成でモデルロード済みのワーカーを再利用する。
+    """
+    global _keep_warm
+    _keep_warm = enabled
+    if not enabled:
+        shutdown_workers()
+
+
+def shutdown_workers(wait=True):
+    """
+    残しているワーカープールを終了
+
+    Args:
+        wait: False なら実行中のセグメントを待たず、未着手のものは取り消す
+    """
+    global _warm_pool
+    if _warm_pool is not None:
+        _warm_pool[0].shutdown(wait=wait, cancel_futures=not wait)
+        _warm_pool = None
+
+
+def _acquire_pool(checkpoint_dir, num_segments):
+    """
+    ワーカープールを用意
+
+    Returns:
+        (プール, ワーカー数, ワーカーごとのスレッド数)
+    """
+    global _warm_pool
+    if _warm_pool is not None and _warm_pool[1] == str(checkpoint_dir):
+        pool, _, workers, threads = _warm_pool
+        return pool, workers, threads
+    shutdown_workers()
+
+    workers, threads = plan_workers(num_segments)
+    if workers == 0:
+        raise RuntimeError("ワーカー1つ分の空きメモリがありません")
+    # fork だと親の torch スレッドプールを引き継ぐため spawn を使う
+    pool = ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=_init_worker,
+        initargs=(str(checkpoint_dir), threads),
+    )
+    if _keep_warm:
+        _warm_pool = (pool, str(checkpoint_dir), workers, threads)
+    return pool, workers, threads
+
+
+def generate_sharded(prompt, duration, checkpoint_dir, output_path, seed=None):
+    """
+    セグメントを並列生成し、連結しながらWAVに書き出す
+
+    同時に投入するセグメントは ワーカー数 + 1 までで、1つ書き出すごとに次を投入する。
+
+    Args:
+        prompt: 音楽プロンプト
+        duration: 生成時間（秒）
+        checkpoint_dir: ACE-Step チェックポイントのパス
+        output_path: 出力WAVパス
+        seed: 乱数シード（セグメントごとに +index）
+
+    Returns:
+        書き込んだフレーム数
+    """
+    lengths = plan_segments(duration)
+    pool, workers, threads = _acquire_pool(checkpoint_dir, len(lengths))
+    if seed is None:
+        seed = int.from_bytes(os.urandom(4), 'little')
+
+    print(f"🧩 シャーディング生成: {len(lengths)}セグメント / "
+          f"{workers}ワーカー x {threads}スレッド")
+
+    # 実行中・待機中のセグメントは ワーカー数 + 1 までに抑え、
+    # 書き出し前の結果がメモリに溜まらないようにする
+    pending = collections.deque()
+    queue = iter(enumerate(lengths))
+
+    def submit_next():
+        item = next(queue, None)
+        if item is not None:
+            i, length = item
+            pending.append(pool.submit(_generate_segment, i, prompt, length, seed + i))
+
+    try:
+        for _ in range(workers + 1):
+            submit_next()
+
+        def completed_in_order():
+            while pending:
+                index, sr, audio = pending.popleft().result()
+                submit_next()
+                print(f"  ✅ セグメント {index + 1}/{len(lengths)} 完了")
+                yield sr, audio if audio.ndim > 1 else audio[:, None]
+
+        segments = completed_in_order()
+        sample_rate, first = next(segments)
+        with WavWriter(output_path, sample_rate, channels=first.shape[1]) as writer:
+            write_crossfaded(
+                itertools.chain([first], (audio for _, audio in segments)),
+                writer,
+                sample_rate,
+            )
+    except Exception as e:
+        # 残りのセグメントは使わないので、終わるのを待たずに取り消す
+        for future in pending:
+            future.cancel()
+        warm = _warm_pool is not None and _warm_pool[0] is pool
+        if not warm:
+            pool.shutdown(wait=False, cancel_futures=True)
+        elif isinstance(e, BrokenProcessPool):
+            # 壊れたプールは再利用しない
+            shutdown_workers(wait=False)
+        raise
+
+    if _warm_pool is None or _warm_pool[0] is not pool:
+        pool.shutdown()
+
+    return writer.frames
@@ -15,6 +15,8 @@ from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 from googleapiclient.http import MediaFileUpload
 
+from artifact_lifecycle import ArtifactManager
+
 OUTPUT_DIR = Path("output")
 
 def get_youtube_client():
@@ -47,9 +49,10 @@ def get_youtube_client():
     
     return youtube
 
-def read_metadata():
+def read_metadata(today=None):
     """メタデータから情報を取得"""
-    today = datetime.now().strftime('%Y-%m-%d')
+    if today is None:
+        today = datetime.now().strftime('%Y-%m-%d')
     metadata_file = OUTPUT_DIR / f"{today}_metadata.txt"
     
     metadata = {}
@@ -183,14 +186,20 @@ def upload_video(youtube, video_path, thumbnail_path, metadata):
         print(f"❌ YouTubeアップロードエラー: {e}")
         return None
 
-def main():
-    """メイン処理"""
+def main(today=None):
+    """
+    メイン処理
+    
+    Args:
+        today: 生成物ファイル名の日付部分（省略時は今日）
+    """
     print("=" * 60)
     print("📤 YouTube 自動投稿")
     print("=" * 60)
     
     # ファイルパス
-    today = datetime.now().strftime('%Y-%m-%d')
+    if today is None:
+        today = datetime.now().strftime('%Y-%m-%d')
     video_path = OUTPUT_DIR / f"{today}_video.mp4"
     thumbnail_path = OUTPUT_DIR / f"{today}_thumbnail.jpg"
     
@@ -200,7 +209,7 @@ def main():
         sys.exit(1)
     
     # メタデータ取得
-    metadata_dict = read_metadata()
+    metadata_dict = read_metadata(today)
     prompt = metadata_dict.get('prompt', 'Chill BGM')
     
     # YouTube メタデータ作成
@@ -213,6 +222,13 @@ def main():
     video_id = upload_video(youtube, video_path, thumbnail_path, video_metadata)
     
     if video_id:
+        # 投稿済みの生成物は上限超過時に古い順で削除される
+        artifacts = ArtifactManager(OUTPUT_DIR)
+        artifacts.consume(video_path, 'upload')
+        artifacts.consume(thumbnail_path, 'upload')
+        artifacts.consume(OUTPUT_DIR / f"{today}_metadata.txt", 'upload')
+        artifacts.enforce_budget()
+        
         print("")
         print("✅ YouTube投稿完了！")
         print(f"🎬 動画ID: {video_id}")